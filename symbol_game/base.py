@@ -1,8 +1,9 @@
-from typing import Protocol, Literal, Optional, List, Dict
+import threading
+from typing import Protocol, Literal, Optional, List, Dict, Iterable, Set
 from concurrent.futures import ThreadPoolExecutor
 
 from . import connection
-from .messages import Identity
+from .messages import Identity, BaseMessage
 
 
 class GameProtocol(Protocol):
@@ -15,6 +16,8 @@ class GameProtocol(Protocol):
     connections: connection.ConnectionStore
     server: connection.Server
     thread_pool: ThreadPoolExecutor
+    thread_pool_size: int
+    peer_connected: threading.Condition
 
     # Frontend
     frontend: Literal['cli', 'gui']
@@ -27,13 +30,24 @@ class GameProtocol(Protocol):
 
     # Player and symbol management
     players: List[Identity]
+    peers: List[Identity]           # players without ourselves, fixed once the game starts
     symbols: Dict[Identity, str]
+    taken_symbols: Set[str]         # Values of symbols, for O(1) uniqueness checks
     player_ids: Dict[Identity, int]
+    players_by_id: Dict[int, Identity]  # Reverse of player_ids
+    my_id: Optional[int]            # Our own entry in player_ids, once the game started
+    my_symbol: Optional[str]        # Our own entry in symbols, once the game started
     pending_symbol: Optional[str]   # Symbol waiting for validation
 
     # Game state
     board_size: int
-    board: List[List[Optional[str]]]
+    board: bytearray            # Row-major cells: 0 if empty, else an index into symbol_table
+    symbol_table: List[Optional[str]]   # Board code -> symbol, code 0 is the empty cell
+    symbol_codes: Dict[str, int]        # Symbol -> board code
+    # Board code -> cells held on each line: n rows, n columns, diagonal, anti-diagonal
+    line_counts: Dict[int, List[int]]
+    board_separator: str        # Line printed between board rows
+    filled: int                 # Number of non-empty cells
     turn_order: List[int]       # Order of player IDs
     current_turn: int           # Index of turn_order
     winner_id: Optional[int]    # Winning player ID
@@ -49,7 +63,27 @@ class GameProtocol(Protocol):
 
     def is_my_turn(self) -> bool:
         """Check if it's this player's turn."""
-        return self.turn_order[self.current_turn] == self.player_ids[self.me]
+        return self.turn_order[self.current_turn] == self.my_id
+
+    def cell(self, row: int, col: int) -> Optional[str]:
+        '''Symbol at (row, col), None if the cell is empty'''
+        pass
+
+    def set_cell(self, row: int, col: int, symbol: Optional[str]) -> None:
+        '''Place a symbol at (row, col), None clears the cell'''
+        pass
+
+    def board_rows(self) -> List[List[Optional[str]]]:
+        '''The board as nested rows of symbols, as sent in GameState'''
+        pass
+
+    def load_board(self, rows: List[List[Optional[str]]]) -> None:
+        '''Replace the board with nested rows of symbols'''
+        pass
+
+    def initialize_board(self, size: int) -> None:
+        '''Create an empty game board of the specified size'''
+        pass
 
     def display_board(self) -> None:
         """Display the current state of the game board."""
@@ -59,10 +93,26 @@ class GameProtocol(Protocol):
         '''Dispatch update to frontend and give a new command prompt'''
         pass
 
+    def request_prompt(self) -> None:
+        '''Give a new prompt from the command loop, safe to call from any thread'''
+        pass
+
     def setup_handlers(self, conn: connection.Connection) -> None:
         '''Set up message handlers for new connections'''
         pass
 
+    def ensure_thread_pool(self, workers: int) -> None:
+        '''Grow the game thread pool to at least this many workers'''
+        pass
+
+    def broadcast(self, message: BaseMessage, players: Optional[Iterable[Identity]] = None) -> None:
+        '''Send a message to several players concurrently, by default all but ourselves'''
+        pass
+
+    def set_symbol(self, player: Identity, symbol: str) -> None:
+        '''Record a player's symbol, keeping taken_symbols in sync'''
+        pass
+
     def connect_to_players(self, reconnect: bool = False) -> None:
         """
         Connect to all players with smaller IDs for turn order.
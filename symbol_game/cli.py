@@ -0,0 +1,72 @@
+import argparse
+import functools
+import socket
+import os
+from typing import List, Optional
+from .messages import Identity
+from .game import Game
+from .logging import init_logging
+
+
+@functools.lru_cache(maxsize=None)
+def default_address() -> str:
+    """Local IP address of the default route, found without a DNS lookup"""
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        try:
+            # Connecting a UDP socket only selects a route, nothing is sent
+            sock.connect(("8.8.8.8", 80))
+            return sock.getsockname()[0]
+        except OSError:
+            return "127.0.0.1"
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="Symbols Game")
+    parser.add_argument(
+        "--address", type=str, default=None,
+        help="your IP address, advertised to other players (default: address of the default route)")
+    parser.add_argument("--port", type=int, help="port to bind to", default=10080)
+    parser.add_argument("--name", type=str, help="your username", default=None)
+    parser.add_argument("--join", type=str, help="join a server", default=None)
+    parser.add_argument("--host", action="store_true", help="host a server", default=False)
+    parser.add_argument("--symbol", type=str, help="your symbol", default=None)
+    parser.add_argument("--gui", action="store_true", help="use the GUI", default=False)
+    parser.add_argument("--remote-logging", action="store_true", help="enable remote logging", default=False)
+    parser.add_argument("--reconnect", action="store_true", help="reconnect to existing game", default=False)
+    return parser
+
+
+def main(argv: Optional[List[str]] = None):
+    args = build_parser().parse_args(argv)
+
+    username = args.name or input("Enter your username: ")
+    me = Identity.intern(args.address or default_address(), args.port, username)
+
+    init_logging(me.ip, me.port, args.remote_logging or bool(os.getenv("REMOTE_LOGGING", False)))
+
+    game = Game(me)
+    try:
+        game.start()
+        if args.join:
+            ip, port = args.join.split(":")
+            game.command_join(ip, int(port))
+        if args.host:
+            game.host = game.me
+        if args.symbol:
+            game.command_symbol(args.symbol)
+        if args.reconnect:
+            game.command_resync_game_state()
+        if args.gui:
+            # tkinter is slow to import, only load it for the GUI frontend
+            import tkinter as tk
+            from .gui import GUI
+            game.frontend = "gui"
+            root = tk.Tk()
+            game.gui = GUI(root, game)
+            root.mainloop()
+        else:
+            game.run()
+    except KeyboardInterrupt:
+        print("\nExiting...")
+    finally:
+        game.stop()
@@ -1,14 +1,126 @@
+import bisect
+import functools
+import os
 import threading
 import socket
 import json
 import logging
+import queue
+import selectors
+import struct
+from collections import deque
 from concurrent.futures import ThreadPoolExecutor
-from typing import Dict, Optional, Callable
+from types import MappingProxyType
+from typing import Deque, Dict, List, Mapping, Optional, Sequence, Callable, Type, TypeVar
+from pydantic import ValidationError
 from . import messages
-from .messages import Identity, BaseMessage, message_types
+from .messages import Identity, BaseMessage
 
 _logger = logging.getLogger(__name__)
 
+M = TypeVar('M', bound=BaseMessage)
+
+# Frame header: payload length as a 4-byte big-endian integer
+_LEN = struct.Struct('>I')
+
+# Largest accepted frame payload, a longer header is treated as a broken connection
+MAX_FRAME_SIZE = 1 << 20
+
+# Pools of receive buffers by size class, shared by all connections to avoid allocating on every read.
+# Connections start with the default size and only hold a larger buffer while a large frame is pending.
+BUFFER_SIZES = (256, 4096, 65536)
+RECV_BUFFER_SIZE = 256
+_buffer_pools: "Dict[int, queue.SimpleQueue[bytearray]]" = {size: queue.SimpleQueue() for size in BUFFER_SIZES}
+
+
+def _acquire_buffer(size: int = RECV_BUFFER_SIZE) -> bytearray:
+    """Get a buffer of at least `size` bytes, from the smallest size class that fits"""
+    i = bisect.bisect_left(BUFFER_SIZES, size)
+    if i == len(BUFFER_SIZES):
+        # Larger than any size class, not pooled
+        return bytearray(size)
+    try:
+        return _buffer_pools[BUFFER_SIZES[i]].get_nowait()
+    except queue.Empty:
+        return bytearray(BUFFER_SIZES[i])
+
+
+def _release_buffer(buf: bytearray):
+    pool = _buffer_pools.get(len(buf))
+    if pool is not None:
+        pool.put(buf)
+
+
+def frame(message: BaseMessage) -> bytes:
+    """Length-prefixed wire encoding of a message, to send the same bytes to several peers"""
+    payload = message.to_json_bytes()
+    return _LEN.pack(len(payload)) + payload
+
+
+# Handlers of all connections run on one pool, created on first use
+# and shut down once every ConnectionStore using it has stopped
+_pool_lock = threading.Lock()
+_pool: Optional[ThreadPoolExecutor] = None
+_pool_users = 0
+
+
+def _shared_pool() -> ThreadPoolExecutor:
+    global _pool
+    pool = _pool
+    if pool is not None:
+        return pool
+    with _pool_lock:
+        if _pool is None:
+            # Handlers mostly wait on the network, so size like an I/O pool rather than per core
+            _pool = ThreadPoolExecutor(
+                max_workers=min(32, (os.cpu_count() or 1) + 4), thread_name_prefix="dispatch")
+        return _pool
+
+
+def _retain_shared_pool():
+    global _pool_users
+    with _pool_lock:
+        _pool_users += 1
+
+
+def _release_shared_pool():
+    """Drop one user of the shared pool, shutting it down after the last one"""
+    global _pool, _pool_users
+    with _pool_lock:
+        _pool_users -= 1
+        if _pool_users:
+            return
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(cancel_futures=True)
+
+
+# Unacknowledged data older than this fails the connection instead of hanging, in milliseconds
+TCP_USER_TIMEOUT_MS = 30000
+
+# (level, option, value) set on every peer socket, accepted or connected
+SOCKET_OPTIONS = [
+    # Small request/response control messages, don't let Nagle hold them back
+    (socket.IPPROTO_TCP, socket.TCP_NODELAY, 1),
+    # Long-lived peer connections: keep them alive, and fail fast when the peer is gone
+    (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1),
+]
+if hasattr(socket, "TCP_USER_TIMEOUT"):
+    # Linux only
+    SOCKET_OPTIONS.append((socket.IPPROTO_TCP, socket.TCP_USER_TIMEOUT, TCP_USER_TIMEOUT_MS))
+
+
+def _tune_socket(sock: socket.socket):
+    """Apply SOCKET_OPTIONS to a peer socket"""
+    for level, option, value in SOCKET_OPTIONS:
+        sock.setsockopt(level, option, value)
+
+
+@functools.lru_cache(maxsize=None)
+def _hello(me: Identity) -> messages.Hello:
+    """Handshake message for the local node, encoded once and reused for every connection"""
+    return messages.Hello(identity=me)
+
 
 class Connection:
     '''Handles communication between two nodes'''
@@ -20,140 +132,302 @@ class Connection:
         
         self.terminating = threading.Event()
         self.lock = threading.Lock()
-        self.thread_pool = ThreadPoolExecutor(
-            max_workers=1, 
-            thread_name_prefix=f"connection_{transport.ip}_{transport.port}"
-        )
-        self.receive_thread = threading.Thread(
-            target=self.message_loop, name=f"incoming_{transport.ip}_{transport.port}")
-        self.message_handlers: Dict[str, Callable] = {}
+        # Handlers indexed by messages.METHOD_IDS
+        self.message_handlers: Sequence[Optional[Callable]] = [None] * messages.NUM_METHODS
+
+        # Messages read by the reactor, waiting to be handled in order
+        self._inbox: Deque[BaseMessage] = deque()
+        self._dispatching = False
+
+        # Framed receive buffer: each frame is a 4-byte big-endian length followed by JSON
+        self._rxbuf = _acquire_buffer()
+        self._rxlen = 0
 
     def set_message_handler(self, message_type: str, handler: Optional[Callable]):
         """Register a message handler"""
         if handler is None:
-            _logger.debug(f"Unsetting handler for message type: {message_type}")
-            self.message_handlers.pop(message_type, None)
-            return
-        _logger.debug(f"Registering handler for message type: {message_type}")
-        self.message_handlers[message_type] = handler
+            _logger.debug("Unsetting handler for message type: %s", message_type)
+        else:
+            _logger.debug("Registering handler for message type: %s", message_type)
+        # Copy on write, the table may be shared with other connections
+        handlers = list(self.message_handlers)
+        handlers[messages.METHOD_IDS[message_type]] = handler
+        self.message_handlers = handlers
+
+    def set_message_handlers(self, handlers: Sequence[Optional[Callable]]):
+        """Install a whole handler table, indexed by method ID; the table is shared, not copied"""
+        self.message_handlers = handlers
 
     def start(self):
-        """Start the connection and message handling"""
-        # Do initial handshake
-        self.send(messages.Hello(identity=self.me))
-        self.other = messages.Hello(**self.receive()).identity
-        
-        # Start message handling loop
-        self.receive_thread.start()
+        """Do the initial handshake, after which the connection can be added to a ConnectionStore"""
+        self.send(_hello(self.me))
+        hello = self.receive_as(messages.Hello)
+        self.other = hello.identity
 
-    def message_loop(self):
-        """Main message handling loop with improved error handling"""
-        while not self.terminating.is_set():
-            try:
-                msg = self.receive()
-                if msg is None:
-                    continue
-                
-                # Unmarshall message
-                method = BaseMessage(**msg).method
-                if method not in message_types:
-                    _logger.error(f"Invalid message type: {method}")
-                    continue
-                msg_type = message_types[method]
-                msg = msg_type(**msg)
-
-                # Dispatch message to handler
-                if method in self.message_handlers:
-                    handler = self.message_handlers[method]
-                    handler(self, msg)
-                else:
-                    _logger.warning(f"No handler for message type: {method}")
-                    
-            except ConnectionError:
-                _logger.exception("Connection lost")
-                break
-            except Exception as e:
-                _logger.exception(f"Error in message loop: {type(e).__name__}: {e}")
-                if self.terminating.is_set():
-                    break
-
-    def receive(self, timeout=5):
-        """Receive and parse a message with better error handling"""
+    def on_readable(self) -> bool:
+        """
+        Called by the reactor when the socket is readable.
+        Drains the socket and queues all complete messages,
+        returns True if the inbox needs to be dispatched.
+        """
+        try:
+            while self._read(socket.MSG_DONTWAIT):
+                pass
+        except ConnectionError:
+            # Frames read in the same wakeup as the close are still handled, then the close is reported
+            if self.queue_buffered():
+                _shared_pool().submit(self.dispatch_pending)
+            raise
+        return self.queue_buffered()
+
+    def queue_buffered(self) -> bool:
+        """
+        Queue all complete messages already in the receive buffer,
+        returns True if the inbox needs to be dispatched.
+        """
+        received = []
+        while (message := self._next_message()) is not None:
+            received.append(message)
+        if not received:
+            return False
+        with self.lock:
+            self._inbox.extend(received)
+            if self._dispatching:
+                return False
+            self._dispatching = True
+            return True
+
+    def dispatch_pending(self):
+        """Handle queued messages in arrival order, until the inbox is empty"""
+        while True:
+            with self.lock:
+                if not self._inbox:
+                    self._dispatching = False
+                    return
+                pending, self._inbox = self._inbox, deque()
+            for message in pending:
+                try:
+                    self.dispatch(message)
+                except Exception as e:
+                    _logger.exception("Error handling message: %s: %s", type(e).__name__, e)
+
+    def dispatch(self, msg: BaseMessage):
+        """Pass a message to its handler"""
+        handler = self.message_handlers[msg.mid]
+        if handler is not None:
+            handler(self, msg)
+        else:
+            _logger.warning("No handler for message type: %s", msg.method)
+
+    def receive_as(self, message_type: Type[M], timeout: Optional[float] = 5) -> M:
+        """Block until a full message is received, decoded straight into message_type.
+        Raises socket.timeout if the peer sends nothing for `timeout` seconds"""
+        previous = self.socket.gettimeout()
+        self.socket.settimeout(timeout)
+        try:
+            while True:
+                payload = self._next_frame()
+                if payload is not None:
+                    try:
+                        message = message_type.model_validate_json(payload)
+                    except ValidationError as e:
+                        raise ConnectionError(f"Expected {message_type.__name__}: {e}") from e
+                    if _logger.isEnabledFor(logging.INFO):
+                        _logger.info("Successfully received message from %s: %s", self.other, message)
+                    return message
+                self._read()
+        finally:
+            self.socket.settimeout(previous)
+
+    def _read(self, flags: int = 0) -> int:
+        """Read available bytes into the receive buffer, returns the number of bytes read"""
+        if self._rxlen == len(self._rxbuf):
+            self._grow_buffer(len(self._rxbuf) * 2)
         try:
-            data = self.socket.recv(1024)
+            received = self.socket.recv_into(memoryview(self._rxbuf)[self._rxlen:], 0, flags)
+        except BlockingIOError:
+            # Nothing left to read without blocking
+            return 0
         except socket.error as e:
             if not self.terminating.is_set():
-                _logger.error(f"Socket error while receiving: {type(e).__name__}: {e}")
-                raise
-            return None
+                _logger.error("Socket error while receiving: %s: %s", type(e).__name__, e)
+            raise
 
-        if not data:
+        if not received:
             if not self.terminating.is_set():
                 _logger.warning("No bytes received, connection closed by peer")
-                raise ConnectionError("Connection closed by peer")
-            return None
+            raise ConnectionError("Connection closed by peer")
+        self._rxlen += received
+        return received
 
-        try:
-            message = json.loads(data.decode())
-            _logger.info(f"Successfully received message from {self.other}: {message}")
+    def _next_message(self) -> Optional[BaseMessage]:
+        """Decode the next complete message in the receive buffer, if there is one"""
+        while (payload := self._next_frame()) is not None:
+            try:
+                message = messages.decode(payload)
+            except ValidationError as e:
+                _logger.error("Invalid message %r: %s", payload, e)
+                continue
+            if _logger.isEnabledFor(logging.INFO):
+                _logger.info("Successfully received message from %s: %s", self.other, message)
             return message
+        return None
 
-        except json.JSONDecodeError as e:
-            _logger.error(f"Failed to decode message: {data!r}")
-            raise
-                
+    def _next_frame(self) -> Optional[bytearray]:
+        """Pop one complete frame payload off the receive buffer, if there is one"""
+        if self._rxlen < _LEN.size:
+            return None
+        (length,) = _LEN.unpack_from(self._rxbuf, 0)
+        if length > MAX_FRAME_SIZE:
+            raise ConnectionError(f"Frame of {length} bytes exceeds the {MAX_FRAME_SIZE} byte limit")
+        end = _LEN.size + length
+        if end > len(self._rxbuf):
+            self._grow_buffer(end)
+        if self._rxlen < end:
+            return None
+        payload = self._rxbuf[_LEN.size:end]
+        remaining = self._rxlen - end
+        self._rxbuf[:remaining] = self._rxbuf[end:self._rxlen]
+        self._rxlen = remaining
+        if not remaining and len(self._rxbuf) > RECV_BUFFER_SIZE:
+            # Give the large buffer back once the large frame is consumed
+            _release_buffer(self._rxbuf)
+            self._rxbuf = _acquire_buffer()
+        return payload
+
+    def _grow_buffer(self, size: int):
+        """Replace the receive buffer with a larger one, keeping buffered bytes"""
+        buf = _acquire_buffer(size)
+        buf[:self._rxlen] = self._rxbuf[:self._rxlen]
+        _release_buffer(self._rxbuf)
+        self._rxbuf = buf
 
     def send(self, message: BaseMessage):
         """Send a message"""
+        if _logger.isEnabledFor(logging.INFO):
+            _logger.info("Sending message to %s: %s", self.other, message)
         if isinstance(message, BaseMessage):
-            message = message.model_dump()
-            
-        _logger.info(f"Sending message to {self.other}: {message}")
-        self.socket.send(json.dumps(message).encode())
+            payload = message.to_json_bytes()
+        else:
+            payload = json.dumps(message).encode()
+        self._sendmsg_all([_LEN.pack(len(payload)), payload])
+
+    def send_raw(self, data: bytes):
+        """Send an already framed message, see frame()"""
+        self.socket.sendall(data)
+
+    def _sendmsg_all(self, buffers: List[bytes]):
+        """Gather-write all buffers without concatenating them, resuming after partial writes"""
+        views = [memoryview(buf) for buf in buffers]
+        while views:
+            sent = self.socket.sendmsg(views)
+            while views and sent >= len(views[0]):
+                sent -= len(views[0])
+                views.pop(0)
+            if sent:
+                views[0] = views[0][sent:]
 
     def stop(self):
         """Stop the connection"""
-        _logger.info(f"Stopping connection to {self.other}")
+        _logger.info("Stopping connection to %s", self.other)
         self.terminating.set()
         self.socket.shutdown(socket.SHUT_RDWR)
         self.socket.close()
-        self.thread_pool.shutdown(cancel_futures=True)
+        # The receive buffer is not returned to the pool: stop() may run on another thread
+        # while the reactor is still reading into it, so it is left to the garbage collector
 
 class ConnectionStore:
     '''Manages all active connections'''
     def __init__(self):
-        self.connections: Dict[Identity, Connection] = {}
+        # Immutable snapshot, replaced as a whole on every change so reads need no lock
+        self._snapshot: Mapping[Identity, Connection] = MappingProxyType({})
         self.lock = threading.Lock()
+
+        # A single reactor thread reads from all connections,
+        # messages are handled on the dispatch pool
+        self.terminating = threading.Event()
+        self._selector = selectors.DefaultSelector()
+        _retain_shared_pool()
+        self._reactor_thread = threading.Thread(target=self._reactor, name="reactor", daemon=True)
+        self._reactor_thread.start()
     
+    @property
+    def connections(self) -> Mapping[Identity, Connection]:
+        return self._snapshot
+
     def add(self, conn: Connection):
+        # Frames that came in along with the Hello are already buffered, the selector won't report them.
+        # Queue them before registering, from then on only the reactor reads the buffer
+        pending = conn.queue_buffered()
         with self.lock:
-            if conn.other in self.connections:
+            connections = dict(self._snapshot)
+            prev = connections.pop(conn.other, None)
+            if prev is not None:
                 # Likely a reconnection
-                _logger.debug(f"Replacing connection to {conn.other}")
-                prev = self.connections.pop(conn.other)
+                _logger.debug("Replacing connection to %s", conn.other)
                 conn.message_handlers = prev.message_handlers
-                prev.stop()
-            self.connections[conn.other] = conn
+                self._stop(prev)
+            connections[conn.other] = conn
+            self._snapshot = MappingProxyType(connections)
+            self._selector.register(conn.socket, selectors.EVENT_READ, data=conn)
+        if pending:
+            _shared_pool().submit(conn.dispatch_pending)
     
     def remove(self, ident: Identity):
         with self.lock:
-            self.connections.pop(ident)
+            connections = dict(self._snapshot)
+            self._unregister(connections.pop(ident))
+            self._snapshot = MappingProxyType(connections)
     
     def get(self, ident: Identity) -> Optional[Connection]:
-        with self.lock:
-            return self.connections.get(ident)
+        return self._snapshot.get(ident)
     
     @staticmethod
     def connect(other: Identity, me: Identity) -> Connection:
         sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         sock.connect(other.addr)
+        _tune_socket(sock)
         conn = Connection(sock, me=me, transport=other)
         conn.start()
         return conn
 
     def stop_all(self):
-        for conn in self.connections.values():
-            conn.stop()
+        if self.terminating.is_set():
+            # Already stopped, the shared pool was released then
+            return
+        self.terminating.set()
+        self._reactor_thread.join()
+        for conn in list(self._snapshot.values()):
+            self._stop(conn)
+        self._selector.close()
+        _release_shared_pool()
+
+    def _stop(self, conn: Connection):
+        self._unregister(conn)
+        conn.stop()
+
+    def _unregister(self, conn: Connection):
+        try:
+            self._selector.unregister(conn.socket)
+        except (KeyError, ValueError):
+            # Already unregistered, or the socket is closed
+            pass
+
+    def _reactor(self):
+        while not self.terminating.is_set():
+            for key, _ in self._selector.select(timeout=0.5):
+                conn: Connection = key.data
+                try:
+                    if conn.on_readable():
+                        # One task per connection, so a handler that blocks only holds up its own peer.
+                        # The connection's dispatching flag keeps its messages in order
+                        _shared_pool().submit(conn.dispatch_pending)
+                except (ConnectionError, OSError):
+                    if not conn.terminating.is_set():
+                        _logger.exception("Connection to %s lost", conn.other)
+                    self._unregister(conn)
+                except Exception as e:
+                    _logger.exception("Error in reactor: %s: %s", type(e).__name__, e)
 
 class Server:
     '''Handles incoming connections'''
@@ -165,11 +439,17 @@ class Server:
         self.terminating = threading.Event()
         self.connection_store = connection_store
         self.on_connect = None
+
+        # Writing to this pipe wakes up the accept loop on stop
+        self._wake_r, self._wake_w = os.pipe()
+        os.set_blocking(self._wake_r, False)
+        os.set_blocking(self._wake_w, False)
     
     def set_on_connect(self, on_connect: Callable):
         self.on_connect = on_connect
 
     def start(self):
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         self.sock.bind(self.server_addr)
         self.sock.listen(5)
         self.thread.start()
@@ -177,25 +457,37 @@ class Server:
     def stop(self):
         _logger.info("Stopping server")
         self.terminating.set()
-        socket.socket(socket.AF_INET, socket.SOCK_STREAM).connect(self.ident.addr)
-        self.sock.close()
+        os.write(self._wake_w, b'x')
         self.thread.join()
+        self.sock.close()
+        os.close(self._wake_r)
+        os.close(self._wake_w)
 
     def _listen(self):
-        while not self.terminating.is_set():
+        with selectors.DefaultSelector() as selector:
+            selector.register(self.sock, selectors.EVENT_READ)
+            selector.register(self._wake_r, selectors.EVENT_READ)
+            while not self.terminating.is_set():
+                for key, _ in selector.select():
+                    if key.fileobj is self.sock and not self.terminating.is_set():
+                        self._accept()
+
+    def _accept(self):
+        try:
+            conn, addr = self.sock.accept()
+            _tune_socket(conn)
+
+            ident = Identity(addr[0], addr[1])
+            connection = Connection(conn, me=self.ident, transport=ident)
             try:
-                conn, addr = self.sock.accept()
-                if self.terminating.is_set():
-                    break
-                    
-                ident = Identity(ip=addr[0], port=addr[1])
-                connection = Connection(conn, me=self.ident, transport=ident)
                 connection.start()
+            except Exception:
+                # Handshake failed or timed out, don't leak the socket
+                conn.close()
+                raise
+
+            if self.on_connect:
+                self.on_connect(connection)
 
-                if self.on_connect:
-                    self.on_connect(connection)
-                    
-            except Exception as e:
-                _logger.exception(f"Error in server loop: {type(e).__name__}: {e}")
-                if self.terminating.is_set():
-                    break
\ No newline at end of file
+        except Exception as e:
+            _logger.exception("Error in server loop: %s: %s", type(e).__name__, e)
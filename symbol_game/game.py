@@ -1,6 +1,10 @@
 import logging
-from typing import List, Dict, Optional
-from concurrent.futures import ThreadPoolExecutor
+import os
+import queue
+import sys
+import threading
+from typing import ClassVar, List, Dict, Optional, Iterable, Set
+from concurrent.futures import ThreadPoolExecutor, wait
 
 from .base import GameProtocol
 from .logic_lobby import LobbyMixin
@@ -8,11 +12,33 @@ from .logic_start_game import StartGameMixin
 from .logic_turns import GameTurnsMixin
 from .sync import SyncGameStateMixin
 
-from .messages import Identity
-from .connection import Connection, ConnectionStore, Server
+from .messages import Identity, BaseMessage, METHOD_IDS, NUM_METHODS
+from .connection import Connection, ConnectionStore, Server, frame
 
 _logger = logging.getLogger(__name__)
 
+# Environment variable overriding the game thread pool size
+THREADS_ENV = "SYMBOL_GAME_THREADS"
+
+
+def _default_pool_size() -> int:
+    default = max(4, 2 * (os.cpu_count() or 2))
+    value = os.getenv(THREADS_ENV)
+    if not value:
+        return default
+    try:
+        size = int(value)
+    except ValueError:
+        size = 0
+    if size <= 0:
+        _logger.warning("Ignoring %s=%r, expected a positive integer", THREADS_ENV, value)
+        return default
+    return size
+
+
+# Queued to the command loop in place of an input line to redraw the prompt
+_PROMPT = object()
+
 
 class Game(LobbyMixin, StartGameMixin, GameTurnsMixin, SyncGameStateMixin, GameProtocol):
     """
@@ -20,14 +46,44 @@ class Game(LobbyMixin, StartGameMixin, GameTurnsMixin, SyncGameStateMixin, GameP
     Handles both the lobby phase and the game phase, managing player connections,
     game state, and message passing between nodes.
     """
+    # Message method -> name of the Game method handling it
+    HANDLERS: ClassVar[Dict[str, str]] = {
+        'choose_symbol': 'on_choose_symbol',
+        'validate_symbol': 'on_validate_symbol',
+        'start_game': 'on_start_game',
+        'propose_move': 'on_propose_move',
+        'commit_move': 'on_commit_move',
+        'request_game_state': 'on_request_game_state',
+    }
+
     def __init__(self, me: Identity):
         # Core networking components for P2P communication
         self.me = me
         self.connections = ConnectionStore()
         self.server = Server(me, self.connections)
-        self.thread_pool = ThreadPoolExecutor(5, "game")
+        self.thread_pool_size = _default_pool_size()
+        self.thread_pool = ThreadPoolExecutor(self.thread_pool_size, "game")
+        self.peer_connected = threading.Condition()     # Notified by on_connect, see on_start_game
+
+        # Bound handlers indexed by method ID, shared by every connection
+        handlers = [None] * NUM_METHODS
+        for method, name in self.HANDLERS.items():
+            handlers[METHOD_IDS[method]] = getattr(self, name)
+        self.message_handlers = tuple(handlers)
+
+        # Command name -> (handler, argument types, usage)
+        self._commands = {
+            "join": (self.command_join, (str, int), "join <ip> <port>"),
+            "start": (self.command_start, (), "start"),
+            "players": (self.command_players, (), "players"),
+            "symbol": (self.command_symbol, (str,), "symbol <symbol>"),
+            "move": (self.command_move, (int, int), "move <row> <col>"),
+            "board": (self.display_board, (), "board"),
+            "resync": (self.command_resync_game_state, (), "resync"),
+        }
 
         self.frontend = "cli"   # Frontend type: "cli" or "gui"
+        self.input_queue = queue.SimpleQueue()  # Input lines for the cli command loop, see run()
         self.gui = None         # GUI frontend object
 
         # Game phase and role management
@@ -36,13 +92,23 @@ class Game(LobbyMixin, StartGameMixin, GameTurnsMixin, SyncGameStateMixin, GameP
 
         # Player and symbol management
         self.players: List[Identity] = [me]         # List of all players
+        self.peers: List[Identity] = []             # All players but us, set at game start
         self.symbols: Dict[Identity, str] = {}      # Maps players to their symbols
+        self.taken_symbols: Set[str] = set()        # Symbols in use, mirrors symbols.values()
         self.player_ids: Dict[Identity, int] = {}   # Maps players to their numeric IDs
+        self.players_by_id: Dict[int, Identity] = {}    # Reverse of player_ids
+        self.my_id: Optional[int] = None            # Our own player ID
+        self.my_symbol: Optional[str] = None        # Our own symbol, fixed once the game starts
         self.pending_symbol = None                  # Symbol waiting for validation
 
         # Game state
         self.board_size: int = 4                    # Size of the game board
-        self.board: List[List[Optional[str]]] = []  # The game board grid
+        self.board: bytearray = bytearray()         # The game board grid, row-major, see cell()
+        self.symbol_table: List[Optional[str]] = [None]  # Board code -> symbol, 0 is empty
+        self.symbol_codes: Dict[str, int] = {}      # Symbol -> board code
+        self.board_separator: str = ""              # Line between board rows, see display_board
+        self.line_counts: Dict[int, List[int]] = {} # Board code -> cells held per line, see check_win
+        self.filled: int = 0                        # Number of non-empty cells
         self.turn_order: List[int] = []             # Order of player IDs for turns
         self.current_turn: int = 0                  # Index in turn_order
         self.winner_id: Optional[int] = None        # Winning player ID
@@ -52,7 +118,7 @@ class Game(LobbyMixin, StartGameMixin, GameTurnsMixin, SyncGameStateMixin, GameP
         """Initialize the game server and begin accepting connections."""
         self.server.set_on_connect(self.on_connect)
         self.server.start()
-        _logger.info(f"Starting game for {self.me}")
+        _logger.info("Starting game for %s", self.me)
         print(f"Hello, {self.me}!")
         print(f"Wait for other players to join, or join a game with the command 'join <ip> <port>'")
 
@@ -61,62 +127,141 @@ class Game(LobbyMixin, StartGameMixin, GameTurnsMixin, SyncGameStateMixin, GameP
         _logger.info("Stopping game")
         self.server.stop()
         self.connections.stop_all()
+        self.thread_pool.shutdown(wait=False)
+
+    def cell(self, row: int, col: int) -> Optional[str]:
+        """Symbol at (row, col), None if the cell is empty."""
+        return self.symbol_table[self.board[row * self.board_size + col]]
+
+    def set_cell(self, row: int, col: int, symbol: Optional[str]):
+        """Place a symbol at (row, col), None clears the cell."""
+        index = row * self.board_size + col
+        old = self.board[index]
+        new = 0 if symbol is None else self.symbol_code(symbol)
+        if old == new:
+            return
+        if old:
+            self._count_lines(old, row, col, -1)
+        else:
+            self.filled += 1
+        if new:
+            self._count_lines(new, row, col, 1)
+        else:
+            self.filled -= 1
+        self.board[index] = new
+
+    def _count_lines(self, code: int, row: int, col: int, delta: int):
+        """Update how many cells a symbol holds on the lines through (row, col)."""
+        n = self.board_size
+        counts = self.line_counts.get(code)
+        if counts is None:
+            counts = self.line_counts[code] = [0] * (2 * n + 2)
+        counts[row] += delta
+        counts[n + col] += delta
+        if row == col:
+            counts[2 * n] += delta
+        if row + col == n - 1:
+            counts[2 * n + 1] += delta
+
+    def symbol_code(self, symbol: str) -> int:
+        """Board code of a symbol, assigning the next free code on first use."""
+        code = self.symbol_codes.get(symbol)
+        if code is None:
+            code = len(self.symbol_table)
+            self.symbol_table.append(symbol)
+            self.symbol_codes[symbol] = code
+        return code
+
+    def board_rows(self) -> List[List[Optional[str]]]:
+        """The board as nested rows of symbols, as sent in GameState."""
+        n, table = self.board_size, self.symbol_table
+        return [[table[code] for code in self.board[r * n:(r + 1) * n]] for r in range(n)]
+
+    def load_board(self, rows: List[List[Optional[str]]]):
+        """Replace the board with nested rows of symbols."""
+        self.initialize_board(len(rows))
+        for r, row in enumerate(rows):
+            for c, symbol in enumerate(row):
+                if symbol is not None:
+                    self.set_cell(r, c, symbol)
 
     def display_board(self):
         """Display the current state of the game board."""
-        print("\nCurrent board:")
-        for row in self.board:
-            print("|", end=" ")
-            for cell in row:
-                print(cell if cell else "·", end=" | ")
-            print("\n" + "-" * (self.board_size * 4 + 1))
+        n, table = self.board_size, self.symbol_table
+        lines = ["\nCurrent board:"]
+        for r in range(n):
+            cells = (table[code] or "·" for code in self.board[r * n:(r + 1) * n])
+            lines.append("| " + " | ".join(cells) + " | ")
+            lines.append(self.board_separator)
+        print("\n".join(lines))
 
     def run(self):
         """Main command loop handling user input and game commands."""
+        threading.Thread(target=self._read_input, name="input", daemon=True).start()
         while True:
             try:
-                cmd = input()
+                cmd = self.input_queue.get()
+            except KeyboardInterrupt:
+                break
+            if cmd is None:
+                # stdin closed, e.g. piped input ran out: nothing more will come
+                break
+            if cmd is _PROMPT:
+                self.prompt()
+                continue
+            try:
                 exit = self.run_command(cmd)
-                if exit:
-                    break
+            except OSError as e:
+                # Network failures, e.g. joining a node that isn't there or a resync timing out
+                _logger.error("Error processing command: %s: %s", type(e).__name__, e)
+                continue
             except Exception as e:
-                _logger.exception(f"Error processing command: {type(e).__name__}: {e}")
+                # Last resort, one bad command shouldn't end the game for everyone
+                _logger.exception("Error processing command: %s: %s", type(e).__name__, e)
+                continue
+            if exit:
+                break
+
+    def _read_input(self):
+        """Feed stdin lines to the command loop, None marks the end of input."""
+        for line in iter(sys.stdin.readline, ""):
+            self.input_queue.put(line)
+        self.input_queue.put(None)
+
+    def request_prompt(self):
+        """Give a new prompt from the command loop, for handlers running on other threads."""
+        if self.frontend == "gui":
+            self.prompt()
+        else:
+            self.input_queue.put(_PROMPT)
 
     def run_command(self, cmd):
-        cmd = cmd.split()
-        if not cmd:
+        # Any whitespace separates the command from its arguments
+        parts = cmd.split(None, 1)
+        if not parts:
             return
-        command = cmd[0]
-        if command == "join":
-            if len(cmd) != 3:
-                print("Usage: join <ip> <port>")
-                return
-            ip, port = cmd[1], int(cmd[2])
-            self.command_join(ip, port)
-        elif command == "start":
-            self.command_start()
-        elif command == "players":
-            self.command_players()
-        elif command == "symbol":
-            if len(cmd) != 2:
-                print("Usage: symbol <symbol>")
-                return
-            self.command_symbol(cmd[1])
-        elif command == "move":
-            if len(cmd) != 3:
-                print("Usage: move <row> <col>")
-                return
-            row, col = int(cmd[1]), int(cmd[2])
-            self.command_move(row, col)
-        elif command == "board":
-            self.display_board()
-        elif command == "exit":
+        command, rest = parts[0], parts[1] if len(parts) > 1 else ""
+        if command == "exit":
             return True
-        elif command == "resync":
-            self.command_resync_game_state()
-        else:
+        entry = self._commands.get(command)
+        if entry is None:
             print("Unknown command:", command)
             print("Available commands: join, start, players, symbol, move, board, exit")
+        else:
+            handler, types, usage = entry
+            if types:
+                args = rest.split()
+                if len(args) != len(types):
+                    print("Usage:", usage)
+                    return
+                try:
+                    args = [convert(arg) for convert, arg in zip(types, args)]
+                except ValueError:
+                    print("Usage:", usage)
+                    return
+                handler(*args)
+            else:
+                handler()
         self.prompt()
 
     def prompt(self):
@@ -136,45 +281,74 @@ class Game(LobbyMixin, StartGameMixin, GameTurnsMixin, SyncGameStateMixin, GameP
 
     def on_connect(self, conn: Connection):
         """Handle new connection and set up message handlers."""
+        # Handlers go in first, frames that came with the Hello are dispatched as soon as it's added
+        self.setup_handlers(conn)
         if self.phase == 'lobby':
             if self.can_host:
                 # Become host
                 self.host = self.me
-                _logger.info(f"{conn.other} has connected")
+                _logger.info("%s has connected", conn.other)
                 
                 # Update game state and inform user
-                self.connections.add(conn)
                 self.players.append(conn.other)
+                self.connections.add(conn)
                 print(f"{conn.other} has connected, start the game with 'start'")
             else:
                 _logger.info(
-                    f"Connected to {conn.other} when we're still in the lobby, "
-                    "assuming that the game has started, we just haven't been notified yet"
+                    "Connected to %s when we're still in the lobby, "
+                    "assuming that the game has started, we just haven't been notified yet",
+                    conn.other,
                 )
                 self.connections.add(conn)
         else:
-            _logger.info(f"Connected to {conn.other} during game phase")
+            _logger.info("Connected to %s during game phase", conn.other)
             self.connections.add(conn)
-        
-        self.setup_handlers(conn)
-        self.prompt()
+
+        with self.peer_connected:
+            self.peer_connected.notify_all()
+        self.request_prompt()
 
     def setup_handlers(self, conn: Connection):
-        conn.set_message_handler('choose_symbol', self.on_choose_symbol)
-        conn.set_message_handler('validate_symbol', self.on_validate_symbol)
-        conn.set_message_handler('start_game', self.on_start_game)
-        conn.set_message_handler('propose_move', self.on_propose_move)
-        conn.set_message_handler('commit_move', self.on_commit_move)
-        conn.set_message_handler('request_game_state', self.on_request_game_state)
-        return 
+        conn.set_message_handlers(self.message_handlers)
     
     def connect_to_players(self, reconnect = False):
-        for player in self.players:
-            if player == self.me:
-                continue
-            if not reconnect and self.player_ids[player] < self.player_ids[self.me]:
+        my_id = self.my_id
+        connections = self.connections.connections
+        for player in self.peers:
+            if not reconnect and self.player_ids[player] < my_id:
                 continue
-            if player not in self.connections.connections:
+            if player not in connections:
                 conn = self.connections.connect(player, self.me)
                 self.setup_handlers(conn)
                 self.connections.add(conn)
+
+    def ensure_thread_pool(self, workers: int):
+        """Grow the game thread pool to at least `workers` threads, so broadcasts don't queue."""
+        if workers <= self.thread_pool_size:
+            return
+        _logger.info("Growing game thread pool to %s workers", workers)
+        old, self.thread_pool = self.thread_pool, ThreadPoolExecutor(workers, "game")
+        self.thread_pool_size = workers
+        old.shutdown(wait=False)
+
+    def broadcast(self, message: BaseMessage, players: Optional[Iterable[Identity]] = None):
+        """Send a message to several players concurrently, on the game thread pool.
+        Defaults to every player but ourselves."""
+        players = self.peers if players is None else list(players)
+        if _logger.isEnabledFor(logging.INFO):
+            _logger.info("Broadcasting message to %s: %s", ", ".join(map(str, players)), message)
+
+        # Frame once up front, every peer gets the same bytes
+        data = frame(message)
+        sends = {}
+        for player in players:
+            conn = self.connections.get(player)
+            if conn is None:
+                _logger.error("Error sending %s to %s: not connected", message.method, player)
+                continue
+            sends[self.thread_pool.submit(conn.send_raw, data)] = player
+        for future in wait(sends).done:
+            e = future.exception()
+            if e is not None:
+                # Connection closed, broken pipe, etc
+                _logger.error("Error sending %s to %s: %s: %s", message.method, sends[future], type(e).__name__, e)
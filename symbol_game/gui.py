@@ -46,7 +46,7 @@ class GUI:
         self.grid_frame = tk.Frame(self.root)
         self.grid_frame.pack(pady=10)
 
-        size = len(self.game.board)
+        size = self.game.board_size
         for row in range(size):
             for col in range(size):
                 button = tk.Button(
@@ -75,8 +75,7 @@ class GUI:
             if self.game.is_my_turn():
                 message="\nIt's your turn!"
             else:
-                next_player = next(p for p in self.game.players
-                                   if self.game.player_ids[p] == self.game.turn_order[self.game.current_turn])
+                next_player = self.game.players_by_id[self.game.turn_order[self.game.current_turn]]
                 message=f"\nIt's {next_player.name}'s turn!"
         if self.game.phase == "end":
             if self.game.winner is None:
@@ -91,10 +90,10 @@ class GUI:
         """Refresh the grid with updated board."""
         if not self.buttons:
             return
-        size = len(self.game.board)
+        size = self.game.board_size
         for row in range(size):
             for col in range(size):
-                symbol = self.game.board[row][col]
+                symbol = self.game.cell(row, col)
                 self.buttons[(row, col)].config(text=symbol)
     
     def update_buttons(self) -> None:
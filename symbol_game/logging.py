@@ -1,16 +1,38 @@
+import atexit
+import copy
 import logging
+import logging.handlers
+import queue
+
+
+class _LocalQueueHandler(logging.handlers.QueueHandler):
+    """Queues records for the listener thread, keeping exc_info for structured formatters.
+    The message is rendered here, so it shows the arguments as they were when logged"""
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
 
 
 def init_logging(ip, port, enable_remote, level = logging.INFO):
-    logging.basicConfig(
-        filename=f'logs/{ip}-{port}-app.log', level=level,
-        format=f'%(asctime)s - {ip}:{port} - %(name)s - %(levelname)s - %(message)s',
-    )
+    root = logging.getLogger()
+    root.setLevel(level)
+
+    handler = logging.FileHandler(f'logs/{ip}-{port}-app.log')
+    handler.setFormatter(logging.Formatter(f'%(asctime)s - {ip}:{port} - %(name)s - %(levelname)s - %(message)s'))
+    handlers = [handler]
 
     if enable_remote:
         import ecs_logging
-        logger = logging.getLogger()
-        logger.setLevel(logging.DEBUG)
+        root.setLevel(logging.DEBUG)
         handler = logging.FileHandler(f'logs/{ip}-{port}-app.log.json')
         handler.setFormatter(ecs_logging.StdlibFormatter(extra={"node": f"{ip}:{port}"}))
-        logger.addHandler(handler)
+        handlers.append(handler)
+
+    # Callers only render the message and enqueue records, file writes happen on the listener thread
+    log_queue = queue.SimpleQueue()
+    root.addHandler(_LocalQueueHandler(log_queue))
+    listener = logging.handlers.QueueListener(log_queue, *handlers)
+    listener.start()
+    atexit.register(listener.stop)
@@ -17,10 +17,11 @@ class LobbyMixin(GameProtocol):
             print("Only hosts can list players in the lobby")
             return
             
-        print("\nPlayers:")
+        lines = ["\nPlayers:"]
         for player in self.players:
             symbol = self.symbols.get(player, "no symbol")
-            print(f"- {player} ({symbol})")
+            lines.append(f"- {player} ({symbol})")
+        print("\n".join(lines))
 
     def command_join(self, ip: str, port: int):
         """Join another player's game session."""
@@ -30,8 +31,11 @@ class LobbyMixin(GameProtocol):
         if self.is_host:
             print("You are already hosting a game, start the game with 'start'")
             return
+        if not 0 <= port <= 65535:
+            print("Port must be between 0 and 65535")
+            return
 
-        conn = self.connections.connect(Identity(ip=ip, port=port), self.me)
+        conn = self.connections.connect(Identity(ip, port), self.me)
         self.setup_handlers(conn)
         print(f"Connected to {conn.other}")
         self.connections.add(conn)
@@ -48,12 +52,12 @@ class LobbyMixin(GameProtocol):
             return
 
         if self.is_host:
-            if symbol not in self.symbols.values() or symbol == self.symbols[self.me]:
-                self.symbols[self.me] = symbol
-                _logger.info(f"Host chose symbol: {symbol}")
+            if symbol not in self.taken_symbols or symbol == self.symbols.get(self.me):
+                self.set_symbol(self.me, symbol)
+                _logger.info("Host chose symbol: %s", symbol)
                 print(f"Successfully chose symbol: {symbol}")
             else:
-                _logger.info(f"Symbol already taken: {symbol}")
+                _logger.info("Symbol already taken: %s", symbol)
                 print("This symbol is already taken")
             return
 
@@ -63,33 +67,41 @@ class LobbyMixin(GameProtocol):
         host_conn = self.connections.get(self.host)
         
         print("Waiting for symbol validation from host...")
-        _logger.info(f"Sending symbol choice to host: {symbol}")
+        _logger.info("Sending symbol choice to host: %s", symbol)
         host_conn.send(choice_msg)
 
     def on_choose_symbol(self, conn: Connection, msg: messages.ChooseSymbol):
         """Handle incoming symbol choice request."""
-        _logger.info(f"Received symbol choice request from {conn.other}: {msg.symbol}")
+        _logger.info("Received symbol choice request from %s: %s", conn.other, msg.symbol)
         
-        is_valid = msg.symbol not in self.symbols.values() or msg.symbol == self.symbols.get(conn.other)
-        _logger.info(f"Symbol {msg.symbol} validation result: {is_valid}")
+        is_valid = msg.symbol not in self.taken_symbols or msg.symbol == self.symbols.get(conn.other)
+        _logger.info("Symbol %s validation result: %s", msg.symbol, is_valid)
         
         response = messages.ValidateSymbol(is_valid=is_valid)
-        _logger.info(f"Sending validation response to {conn.other}: {is_valid}")
+        _logger.info("Sending validation response to %s: %s", conn.other, is_valid)
         conn.send(response)
         
         if is_valid:
-            _logger.info(f"Recording symbol {msg.symbol} for {conn.other}")
-            self.symbols[conn.other] = msg.symbol
+            _logger.info("Recording symbol %s for %s", msg.symbol, conn.other)
+            self.set_symbol(conn.other, msg.symbol)
 
     def on_validate_symbol(self, conn: Connection, msg: messages.ValidateSymbol):
         """Handle symbol validation response."""
-        _logger.info(f"Received symbol validation response: {msg.is_valid}")
+        _logger.info("Received symbol validation response: %s", msg.is_valid)
         
         if msg.is_valid and self.pending_symbol:
-            self.symbols[self.me] = self.pending_symbol
+            self.set_symbol(self.me, self.pending_symbol)
             print(f"\nSuccessfully chose symbol: {self.pending_symbol}")
         else:
             print("\nSymbol choice was invalid (already taken)")
         
         self.pending_symbol = None
-        self.prompt()
+        self.request_prompt()
+
+    def set_symbol(self, player: Identity, symbol: str):
+        """Record a player's symbol, releasing the one they had before."""
+        previous = self.symbols.get(player)
+        if previous is not None:
+            self.taken_symbols.discard(previous)
+        self.symbols[player] = symbol
+        self.taken_symbols.add(symbol)
@@ -1,7 +1,6 @@
 # author: Runjie
 import logging
 import random
-import time
 
 from . import messages
 
@@ -30,8 +29,15 @@ class StartGameMixin(GameProtocol):
 
     def initialize_board(self, size: int):
         """Create an empty game board of the specified size."""
-        self.board = [[None for _ in range(size)] for _ in range(size)]
+        self.board = bytearray(size * size)
         self.board_size = size
+        self.board_separator = "-" * (size * 4 + 1)
+        self.symbol_table = [None]
+        self.symbol_codes = {}
+        self.line_counts = {}
+        self.filled = 0
+        for symbol in self.symbols.values():
+            self.symbol_code(symbol)
 
     def command_start(self):
         """Start the game with proper initialization (host only)."""
@@ -39,20 +45,21 @@ class StartGameMixin(GameProtocol):
             return
 
         # Assign IDs and generate turn order
-        for i, player in enumerate(self.players, 1):
-            self.player_ids[player] = i
-        turn_order = list(self.player_ids.values())
-        random.shuffle(turn_order)
+        ids = range(1, len(self.players) + 1)
+        self.player_ids.update(zip(self.players, ids))
+        self.players_by_id.update(zip(ids, self.players))
+        self.peers = [player for player in self.players if player != self.me]
+        turn_order = random.sample(ids, len(ids))
 
         # Create player information for start message
         player_info = [
             {
-                "id": self.player_ids[player],
-                "name": player.name or f"Player{self.player_ids[player]}",
-                "address": f"{player.ip}:{player.port}",
+                "id": player_id,
+                "name": player.name or f"Player{player_id}",
+                "address": player.address,
                 "symbol": self.symbols[player]
             }
-            for player in self.players
+            for player_id, player in zip(ids, self.players)
         ]
 
         # Create and send start game message
@@ -64,10 +71,7 @@ class StartGameMixin(GameProtocol):
         )
 
         # Send to all other players
-        for player in self.players:
-            if player != self.me:
-                conn = self.connections.get(player)
-                conn.send(msg)
+        self.broadcast(msg)
 
         # Start game locally
         self.on_start_game(None, msg)
@@ -77,25 +81,28 @@ class StartGameMixin(GameProtocol):
         self.phase = "game"
         self.initialize_board(msg.board_size)
 
-        # Process player information
-        for player_info in msg.players:
-            player_id = player_info["id"]
-            addr = player_info["address"].split(":")
-            player = Identity(ip=addr[0], port=int(addr[1]), name=player_info["name"])
-
-            # Store both ID and symbol
-            self.player_ids[player] = player_id
-            self.symbols[player] = player_info["symbol"]
-
-            # Make sure player is in players list
-            if player not in self.players:
-                self.players.append(player)
-
-
-            """for player in self.players:
-                if f"{player.ip}:{player.port}" == player_info["address"]:
-                    self.player_ids[player] = player_id
-                    break"""
+        # Process player information, the host (conn is None) built msg from its own state
+        if conn is not None:
+            known = set(self.players)
+            for player_info in msg.players:
+                player_id = player_info["id"]
+                addr = player_info["address"].split(":")
+                player = Identity.intern(addr[0], int(addr[1]), player_info["name"])
+
+                # Store both ID and symbol
+                self.player_ids[player] = player_id
+                self.players_by_id[player_id] = player
+                self.set_symbol(player, player_info["symbol"])
+
+                # Make sure player is in players list
+                if player not in known:
+                    known.add(player)
+                    self.players.append(player)
+            self.peers = [player for player in self.players if player != self.me]
+        self.my_id = self.player_ids[self.me]
+        self.my_symbol = self.symbols[self.me]
+        # Every peer gets its own worker when fanning out moves
+        self.ensure_thread_pool(len(self.peers))
 
         # Set up turn order
         self.turn_order = msg.turn_order
@@ -105,24 +112,25 @@ class StartGameMixin(GameProtocol):
         # ID, NOT TURN ORDER, this should not be randomized
         self.connect_to_players()
 
-        # Wait for all other players to connect
-        time.sleep(0.02)
-        for player in self.players:
-            if player != self.me and player not in self.connections.connections:
-                print(f"Waiting for {player} to connect...")
-                while player not in self.connections.connections:
-                    time.sleep(0.01)
+        # Wait for all other players to connect, on_connect notifies as they come in
+        connections = self.connections
+        with self.peer_connected:
+            # Give connections already in flight a moment before reporting anyone missing
+            self.peer_connected.wait_for(lambda: all(p in connections.connections for p in self.peers), 0.02)
+            for player in self.peers:
+                if player not in connections.connections:
+                    print(f"Waiting for {player} to connect...")
+                    self.peer_connected.wait_for(lambda: player in connections.connections)
 
         # Display game start information
-        print("\nGame started!")
-        print("\nPlayers and their symbols:")
+        lines = ["\nGame started!", "\nPlayers and their symbols:"]
         for player_info in msg.players:
-            print(f"- Player {player_info['id']}: {player_info['name']} ({player_info['symbol']})")
-        
-        print("\nTurn order:", " -> ".join(map(str, self.turn_order)))
-        print(f"\nBoard size: {self.board_size}x{self.board_size}")
+            lines.append(f"- Player {player_info['id']}: {player_info['name']} ({player_info['symbol']})")
+        lines.append("\nTurn order: " + " -> ".join(map(str, self.turn_order)))
+        lines.append(f"\nBoard size: {self.board_size}x{self.board_size}")
+        print("\n".join(lines))
         self.display_board()
 
         if self.is_my_turn():
             print("\nIt's your turn! Use 'move <row> <col>' to make a move.")
-            self.prompt()
+            self.request_prompt()
@@ -1,35 +1,80 @@
-from pydantic import BaseModel
-from typing import Literal, Optional, List, Dict, Any
+import sys
+from dataclasses import dataclass, field
+from pydantic import AfterValidator, BaseModel, Field, PrivateAttr, TypeAdapter
+from typing import Annotated, ClassVar, Literal, Optional, List, Dict, Any, Union
 
-class Identity(BaseModel):
+# dataclass(slots=True) needs Python 3.10
+_SLOTS = {'slots': True} if sys.version_info >= (3, 10) else {}
+
+# Canonical Identity instances, see Identity.intern. Entries are kept, so only player identities
+# (our own and those from Hello or StartGame) are interned, not ephemeral transport addresses
+_identities: Dict[tuple, 'Identity'] = {}
+
+
+@dataclass(frozen=True, eq=False, **_SLOTS)
+class Identity:
     '''
     Identity of a node - contains connection information
     '''
     ip: str
     port: int
     name: Optional[str] = None
+    # Identities are dict keys on every message dispatch, so hash once
+    _hash: int = field(init=False, repr=False, compare=False)
+    # "ip:port", as used in StartGame player info
+    address: str = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        # Most peers share a handful of addresses, interning dedupes the strings
+        object.__setattr__(self, 'ip', sys.intern(self.ip))
+        object.__setattr__(self, '_hash', hash((self.ip, self.port)))
+        object.__setattr__(self, 'address', f"{self.ip}:{self.port}")
+
+    @classmethod
+    def intern(cls, ip: str, port: int, name: Optional[str] = None) -> 'Identity':
+        '''Shared instance for these fields, so that equal identities are mostly the same object'''
+        key = (ip, port, name)
+        ident = _identities.get(key)
+        if ident is None:
+            ident = _identities.setdefault(key, cls(ip, port, name))
+        return ident
 
     @property
     def addr(self):
         return (self.ip, self.port)
 
     def __hash__(self):
-        return hash((self.ip, self.port))
+        return self._hash
     
     def __eq__(self, other):
+        if self is other:
+            return True
+        if not isinstance(other, Identity):
+            return NotImplemented
         return self.ip == other.ip and self.port == other.port
     
     def __str__(self):
         return f"{self.name} ({self.ip}:{self.port})"
 
+# Identity as received in a message, replaced by the interned instance
+InternedIdentity = Annotated[Identity, AfterValidator(lambda i: Identity.intern(i.ip, i.port, i.name))]
+
 class BaseMessage(BaseModel):
     '''Base class for all game messages'''
     method: str
+    mid: ClassVar[int]  # Small integer ID of the method, see METHOD_IDS
+    _json: Optional[bytes] = PrivateAttr(default=None)
+
+    def to_json_bytes(self) -> bytes:
+        '''JSON encoding of the message, cached after the first call'''
+        if self._json is None:
+            self._json = self.model_dump_json().encode()
+        return self._json
 
 class Hello(BaseMessage):
     '''Initial connection message'''
     method: Literal['hello'] = 'hello'
-    identity: Identity
+    identity: InternedIdentity
 
 class StartGame(BaseMessage):
     '''
@@ -82,7 +127,7 @@ class RequestGameState(BaseMessage):
 class GameState(BaseMessage):
     method: Literal['game_state'] = 'game_state'
 
-    players: List[Identity]
+    players: List[InternedIdentity]
     symbols: List[str]
     player_ids: List[int]
 
@@ -91,7 +136,7 @@ class GameState(BaseMessage):
     turn_order: List[int]
     current_turn: int
     winner_id: Optional[int]
-    winner: Optional[Identity]
+    winner: Optional[InternedIdentity]
 
 # Registry of message types
 message_types: Dict[str, type[BaseMessage]] = {
@@ -105,3 +150,20 @@ message_types: Dict[str, type[BaseMessage]] = {
     'request_game_state': RequestGameState,
     'game_state': GameState,
 }
+
+# Small integer IDs for message methods, so handlers can be kept in a list
+METHOD_IDS: Dict[str, int] = {method: i for i, method in enumerate(message_types)}
+NUM_METHODS = len(METHOD_IDS)
+for _method, _msg_type in message_types.items():
+    _msg_type.mid = METHOD_IDS[_method]
+del _method, _msg_type
+
+# Decodes a JSON message straight into its concrete type, selected by the method field
+_message_adapter: TypeAdapter[BaseMessage] = TypeAdapter(
+    Annotated[Union[tuple(message_types.values())], Field(discriminator='method')]
+)
+
+
+def decode(data: Union[bytes, bytearray]) -> BaseMessage:
+    '''Parse and validate a message in a single pass, raises pydantic.ValidationError'''
+    return _message_adapter.validate_json(data)
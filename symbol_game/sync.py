@@ -13,13 +13,13 @@ RESYNC_TIMEOUT = 10.0
 class SyncGameStateMixin(GameProtocol):
     def on_request_game_state(self, conn: Connection, msg: messages.RequestGameState):
         """Handle game state request from a reconnecting player."""
-        _logger.info(f"Sending game state to {conn.other}")
+        _logger.info("Sending game state to %s", conn.other)
         conn.send(messages.GameState(
             players=self.players,
             symbols=[self.symbols[player] for player in self.players],
             player_ids=[self.player_ids[player] for player in self.players],
             board_size=self.board_size,
-            board=self.board,
+            board=self.board_rows(),
             turn_order=self.turn_order,
             current_turn=self.current_turn,
             winner_id=self.winner_id,
@@ -36,10 +36,13 @@ class SyncGameStateMixin(GameProtocol):
             nonlocal synced
             self.players = msg.players
             for (i, player) in enumerate(self.players):
-                self.symbols[player] = msg.symbols[i]
+                self.set_symbol(player, msg.symbols[i])
                 self.player_ids[player] = msg.player_ids[i]
-            self.board_size = msg.board_size
-            self.board = msg.board
+                self.players_by_id[msg.player_ids[i]] = player
+            self.my_id = self.player_ids[self.me]
+            self.my_symbol = self.symbols[self.me]
+            self.peers = [player for player in self.players if player != self.me]
+            self.load_board(msg.board)
             self.turn_order = msg.turn_order
             self.current_turn = msg.current_turn
             self.winner_id = msg.winner_id
@@ -55,7 +58,7 @@ class SyncGameStateMixin(GameProtocol):
         
         deadline = time.time() + RESYNC_TIMEOUT
         while not synced and time.time() < deadline:
-            _logger.debug(f"Waiting for game state synchronization from {self.host}")
+            _logger.debug("Waiting for game state synchronization from %s", self.host)
             time.sleep(0.1)
         
         host_conn.set_message_handler('game_state', None)
@@ -66,5 +69,5 @@ class SyncGameStateMixin(GameProtocol):
             print("\nIt's your turn! Use 'move <row> <col>' to make a move.")
 
         if not synced:
-            _logger.error(f"Failed to synchronize game state with host within {RESYNC_TIMEOUT}s")
+            _logger.error("Failed to synchronize game state with host within %ss", RESYNC_TIMEOUT)
             raise TimeoutError("Failed to synchronize game state with host")
@@ -0,0 +1,96 @@
+'''
+Checks the incremental board state (line counters, filled count) against a cell-by-cell scan
+
+python -m unittest discover tests
+'''
+
+import random
+import unittest
+
+from symbol_game.game import Game
+from symbol_game.messages import Identity
+
+SYMBOLS = ["x", "o", "z"]
+
+
+def reference_win(rows, row, col, symbol):
+    n = len(rows)
+    if all(rows[row][c] == symbol for c in range(n)):
+        return True
+    if all(rows[r][col] == symbol for r in range(n)):
+        return True
+    if row == col and all(rows[i][i] == symbol for i in range(n)):
+        return True
+    if row + col == n - 1 and all(rows[i][n - 1 - i] == symbol for i in range(n)):
+        return True
+    return False
+
+
+def reference_full(rows):
+    return all(cell is not None for row in rows for cell in row)
+
+
+class BoardTest(unittest.TestCase):
+    def setUp(self):
+        self.game = Game(Identity("127.0.0.1", 0, "test"))
+
+    def tearDown(self):
+        self.game.connections.stop_all()
+        self.game.server.sock.close()
+        self.game.thread_pool.shutdown()
+
+    def assertMatchesReference(self):
+        game = self.game
+        rows = game.board_rows()
+        self.assertEqual(game.is_board_full(), reference_full(rows))
+        for r in range(game.board_size):
+            for c in range(game.board_size):
+                for symbol in SYMBOLS:
+                    self.assertEqual(
+                        game.check_win(r, c, symbol), reference_win(rows, r, c, symbol),
+                        f"check_win({r}, {c}, {symbol!r}) on {rows}")
+
+    def test_random_boards(self):
+        rng = random.Random(1)
+        game = self.game
+        for _ in range(2000):
+            n = rng.randint(1, 6)
+            game.initialize_board(n)
+            # Fill, overwrite and clear random cells
+            for _ in range(rng.randint(0, 3 * n * n)):
+                r, c = rng.randrange(n), rng.randrange(n)
+                game.set_cell(r, c, rng.choice(SYMBOLS + [None]))
+            self.assertMatchesReference()
+
+    def test_propose_and_undo(self):
+        # on_propose_move places a symbol to check the result, then clears it again
+        rng = random.Random(2)
+        game = self.game
+        for _ in range(200):
+            n = rng.randint(2, 5)
+            game.initialize_board(n)
+            for _ in range(rng.randint(0, n * n)):
+                game.set_cell(rng.randrange(n), rng.randrange(n), rng.choice(SYMBOLS))
+            before = game.board_rows()
+            for r in range(n):
+                for c in range(n):
+                    if game.cell(r, c) is None:
+                        game.set_cell(r, c, rng.choice(SYMBOLS))
+                        self.assertMatchesReference()
+                        game.set_cell(r, c, None)
+            self.assertEqual(game.board_rows(), before)
+            self.assertMatchesReference()
+
+    def test_load_board(self):
+        rng = random.Random(3)
+        game = self.game
+        for _ in range(500):
+            n = rng.randint(1, 6)
+            rows = [[rng.choice(SYMBOLS + [None]) for _ in range(n)] for _ in range(n)]
+            game.load_board(rows)
+            self.assertEqual(game.board_rows(), rows)
+            self.assertMatchesReference()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+'''
+Checks the length-prefixed frame reader of Connection
+
+python -m unittest discover tests
+'''
+
+import socket
+import threading
+import unittest
+
+from symbol_game.connection import Connection, RECV_BUFFER_SIZE, MAX_FRAME_SIZE, frame, _LEN
+from symbol_game.messages import Identity, ChooseSymbol, CommitMove, GameState
+
+ME = Identity("127.0.0.1", 1, "test")
+
+
+class FramingTest(unittest.TestCase):
+    def setUp(self):
+        self.writer, reader = socket.socketpair()
+        self.conn = Connection(reader, me=ME, transport=ME)
+        self.received = []
+        self.handled = threading.Event()
+        for method in ("choose_symbol", "commit_move", "game_state"):
+            self.conn.set_message_handler(method, self.on_message)
+
+    def tearDown(self):
+        self.writer.close()
+        self.conn.socket.close()
+
+    def on_message(self, conn, msg):
+        self.received.append(msg)
+        self.handled.set()
+
+    def feed(self, data: bytes):
+        """Write bytes to the connection and let it handle everything that is complete"""
+        self.writer.sendall(data)
+        if self.conn.on_readable():
+            self.conn.dispatch_pending()
+
+    def assertReceived(self, expected):
+        self.assertEqual([m.model_dump() for m in self.received], [m.model_dump() for m in expected])
+
+    def test_fragmented_frames(self):
+        messages = [
+            ChooseSymbol(symbol="x"),
+            CommitMove(location=[1, 2], symbol="x", player_id=1),
+            ChooseSymbol(symbol="o"),
+        ]
+        data = b"".join(frame(m) for m in messages)
+        for size in (1, 3, 7):
+            self.received.clear()
+            for i in range(0, len(data), size):
+                self.feed(data[i:i + size])
+            self.assertReceived(messages)
+            self.assertEqual(self.conn._rxlen, 0)
+
+    def test_large_frame(self):
+        players = [Identity("10.0.0.%d" % i, 1000 + i, "p%d" % i) for i in range(20)]
+        state = GameState(
+            players=players, symbols=["x"] * 20, player_ids=list(range(20)),
+            board_size=20, board=[["x"] * 20 for _ in range(20)],
+            turn_order=list(range(20)), current_turn=0, winner_id=None, winner=None)
+        small = ChooseSymbol(symbol="x")
+        data = frame(small) + frame(state) + frame(small)
+        self.assertGreater(len(frame(state)), RECV_BUFFER_SIZE)
+        for i in range(0, len(data), 100):
+            self.feed(data[i:i + 100])
+        self.assertReceived([small, state, small])
+        # The large buffer is given back once the large frame is consumed
+        self.assertEqual(len(self.conn._rxbuf), RECV_BUFFER_SIZE)
+
+    def test_oversized_header(self):
+        with self.assertRaises(ConnectionError):
+            self.feed(_LEN.pack(MAX_FRAME_SIZE + 1) + b"{}")
+        self.assertReceived([])
+
+    def test_frames_before_close(self):
+        self.writer.sendall(frame(ChooseSymbol(symbol="x")))
+        self.writer.shutdown(socket.SHUT_WR)
+        with self.assertRaises(ConnectionError):
+            self.conn.on_readable()
+        # Handed to the dispatch pool before the close is reported
+        self.assertTrue(self.handled.wait(5))
+        self.assertReceived([ChooseSymbol(symbol="x")])
+
+
+if __name__ == "__main__":
+    unittest.main()